@@ -1,21 +1,95 @@
 
 # Import necessary libraries
-# Import necessary libraries
-import math
+import functools
+import hashlib
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 import streamlit as st
-import googlemaps
-from googlemaps import exceptions
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from streamlit.runtime.scriptrunner_utils.script_run_context import SCRIPT_RUN_CONTEXT_ATTR_NAME
 import googlemaps
 import requests
-from langchain_community.chat_message_histories import ChatMessageHistory
-from langchain.chains import LLMChain
-from langchain.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import diskcache
+
+# Shared HTTP session so repeated OpenWeather and Google Maps calls reuse pooled TCP/TLS connections.
+# Transient rate-limit and server errors from OpenWeather are retried with backoff before surfacing.
+_retry = Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504])
+_session = requests.Session()
+# The session is shared by every Streamlit session's lookups and prefetches, so the per-host pool is
+# sized above the worker count to avoid discarding keep-alive connections under concurrent use.
+_session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=24, max_retries=_retry))
+_session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=24, max_retries=_retry))
+# Google Maps requests get an adapter without status retries (the longest mounted prefix wins), so 5xx
+# responses reach the googlemaps client, which retries them itself within its retry_timeout
+_session.mount("https://maps.googleapis.com/", HTTPAdapter(pool_connections=1, pool_maxsize=24))
+# Worker pools for concurrent API lookups, so threads are not spun up on every generation.
+# Both are shared by every browser session: the generation pool is sized for about 5 sessions generating
+# at once (3 lookups each), and prefetches have their own pool so they can never starve a generation.
+_io_pool = ThreadPoolExecutor(max_workers=16)
+_prefetch_pool = ThreadPoolExecutor(max_workers=4)
+def _submit_io(fn, *args, pool=_io_pool):
+    # Submits fn to the pool with the calling session's script context attached to the worker,
+    # so the st.cache_data lookups it makes run as they would on the script thread (without warnings).
+    # The context is detached afterwards, so an idle worker does not keep a finished session alive and
+    # the next task never runs under another user's session.
+    ctx = get_script_run_ctx()
+    def run():
+        thread = threading.current_thread()
+        if ctx is not None:
+            add_script_run_ctx(thread, ctx)
+        try:
+            return fn(*args)
+        finally:
+            # add_script_run_ctx(thread, None) would re-attach the current context, so the attribute is cleared directly
+            setattr(thread, SCRIPT_RUN_CONTEXT_ATTR_NAME, None)
+    return pool.submit(run)
+# On-disk store of finished itineraries, so a browser reload or server restart does not pay for
+# the LLM, Maps and weather calls again for the same trip. Entries expire after a day because
+# the itinerary text includes the weather forecast.
+# The Google lookups are persisted here too, underneath their in-memory st.cache_data layer,
+# so their results also survive restarts (including Streamlit's auto-reload on code changes).
+_disk_cache = diskcache.Cache(".trip_cache", size_limit=100 * 2**20)
+TRIP_CACHE_TTL = 86400
+# ----------------------------------------_disk_cached()--------------------------------------------------------------------------------------------------------------
+def _disk_cached(key, compute, expire=TRIP_CACHE_TTL):
+    # Returns the value stored on disk under key, computing and storing it on a miss.
+    # Exceptions propagate without storing anything, so failures are retried on the next call.
+    value = _disk_cache.get(key)
+    if value is None:
+        value = compute()
+        _disk_cache.set(key, value, expire=expire)
+    return value
+# ----------------------------------------make_gmaps_client()--------------------------------------------------------------------------------------------------------------
+# Function to build a Google Maps client on the shared HTTP session
+def make_gmaps_client(api_key):
+    """
+    Builds a Google Maps client that sends its requests through the shared pooled session,
+    so Maps and OpenWeather lookups reuse the same keep-alive connections.
+    The session's Maps adapter does not retry, so the client's own handling applies: it retries
+    over-query-limit and 500/503/504 responses with jittered exponential backoff, and starts no new
+    attempt once 10s have passed (the default is 60s). Each attempt times out after 5s (no timeout
+    by default), so a failing lookup gives up after at most about 15s instead of stalling the
+    concurrent lookups in generate_itinerary.
+    Args:
+        api_key (str): The API key for Google Maps.
+    Returns:
+        googlemaps.Client: The Google Maps client.
+    """
+    return googlemaps.Client(key=api_key, requests_session=_session, timeout=5, retry_timeout=10)
 # ----------------------------------------render_input_form()--------------------------------------------------------------------------------------------------------------
 # Function to render the input form for trip details
-def render_input_form():
+def render_input_form(gmapsclient=None, openweather_api_key=None):
     """
     Renders an input form for trip details using Streamlit and returns the user inputs.
+    The destination is entered above the form so that, once it is committed, its attractions
+    and weather can be prefetched in the background while the rest of the form is filled in.
+    Args:
+        gmapsclient (googlemaps.Client, optional): Google Maps client used for prefetching.
+        openweather_api_key (str, optional): OpenWeather API key used for prefetching.
     Returns:
         tuple: A tuple containing the following elements:
             - submitted (bool): Indicates whether the form was submitted.
@@ -26,19 +100,25 @@ def render_input_form():
             - interests (list of str): A list of selected interests from the predefined options.
     """
     st.markdown("### Enter Your Trip Details")
+    # Widgets inside st.form cannot have callbacks, so the destination sits just above it
+    destination = st.text_input("Enter your destination:",
+                                key="dest",
+                                on_change=prefetch_destination if gmapsclient is not None else None,
+                                args=(gmapsclient, openweather_api_key))
     with st.form(key='trip_input_form'):
-        destination = st.text_input("Enter your destination:")
-        no_of_adults = st.number_input("Number of adults:", min_value=1, step=1, format="%d") # Min value 1 adult
-        no_of_children = st.number_input("Number of children:", min_value=0, step=1, format="%d")
-        start_date = st.date_input("Start Date")
-        end_date = st.date_input("End Date")
-        budget = st.number_input("Enter your budget in pounds(£):", min_value=100, step=50, format="%d") # Min value £100
-        interests = st.multiselect("Select your interests:",["Nature", "History", "Food", "Adventure", "Shopping", "Relaxation"])
+        # Stable keys let Streamlit match each widget to its state across reruns.
+        # They must not clash with session state the app sets itself (e.g. `show_hotels`).
+        no_of_adults = st.number_input("Number of adults:", min_value=1, step=1, format="%d", key="adults") # Min value 1 adult
+        no_of_children = st.number_input("Number of children:", min_value=0, step=1, format="%d", key="children")
+        start_date = st.date_input("Start Date", key="start")
+        end_date = st.date_input("End Date", key="end")
+        budget = st.number_input("Enter your budget in pounds(£):", min_value=100, step=50, format="%d", key="budget") # Min value £100
+        interests = st.multiselect("Select your interests:",["Nature", "History", "Food", "Adventure", "Shopping", "Relaxation"], key="interests")
         # New accommodation preferences section
         st.markdown("### Accommodation Preferences")
-        accommodation_type = st.multiselect("Preferred accommodation types:", ["Hotel", "Hostel", "Apartment", "Guesthouse", "Resort"])
-        accommodation_rating = st.slider("Minimum accommodation rating:", 1.0, 5.0, 3.0, 0.5)
-        show_hotels = st.checkbox("Show available hotel options within budget", value=True)
+        accommodation_type = st.multiselect("Preferred accommodation types:", ["Hotel", "Hostel", "Apartment", "Guesthouse", "Resort"], key="acc_types")
+        accommodation_rating = st.slider("Minimum accommodation rating:", 1.0, 5.0, 3.0, 0.5, key="acc_rating")
+        show_hotels = st.checkbox("Show available hotel options within budget", value=True, key="show_hotels_opt")
         submitted = st.form_submit_button("Generate Plan")
     return (
         submitted,
@@ -53,31 +133,126 @@ def render_input_form():
         accommodation_rating,
         show_hotels,
     )
-# Check if the destination is a valid city
-# Validate the destination using a placeholder function
-def is_valid_city(city, gmapsclient):
+# ----------------------------------------prefetch_destination()--------------------------------------------------------------------------------------------------------------
+# Function to speculatively fetch the destination's data while the user fills in the form
+def _prefetch_trip_context(destination, gmapsclient, openweather_api_key):
+    geocode_result = geocode_cached(destination, gmapsclient)
+    if not geocode_result:
+        return None
+    location = geocode_result[0]['geometry']['location']
+    # Both lookups are cached, so the later submit path is served from memory
+    return get_attractions(location, gmapsclient), get_weather(location, openweather_api_key)
+def prefetch_destination(gmapsclient, openweather_api_key):
     """
-    Validates if a given city is valid by attempting to geocode it using the Google Maps API.
+    Callback for the destination input that starts geocoding, attractions and weather lookups
+    for the entered destination on the shared prefetch pool.
+    Only the latest destination is tracked; a superseded prefetch that has not started is cancelled.
     Args:
-        city (str): The name of the city to validate.
         gmapsclient (googlemaps.Client): An instance of the Google Maps API client.
-    Returns:
-        bool: True if the city is valid (can be geocoded), False otherwise.
+        openweather_api_key (str): The OpenWeather API key.
+    Session State Updates:
+        - `st.session_state.prefetched` (tuple): The normalized destination and its prefetch future.
+    """
+    destination = st.session_state.get("dest", "")
+    key = destination.strip().lower()
+    if not key:
+        return
+    previous = st.session_state.get("prefetched")
+    if previous is not None:
+        if previous[0] == key:
+            return # Already fetched (or being fetched) for this destination
+        previous[1].cancel()
+    st.session_state.prefetched = (key, _submit_io(_prefetch_trip_context, destination, gmapsclient, openweather_api_key, pool=_prefetch_pool))
+def wait_for_prefetch(destination, timeout=10):
+    """
+    Waits for an in-flight prefetch of the destination, if any, so that the lookups that follow
+    are served from cache instead of being issued a second time.
+    Args:
+        destination (str): The destination entered by the user.
+        timeout (float): Maximum number of seconds to wait for the prefetch.
     """
+    prefetched = st.session_state.get("prefetched")
+    if prefetched is None or prefetched[0] != destination.strip().lower():
+        return
+    future = prefetched[1]
     try:
-        # Attempt to geocode the city
-        if gmapsclient is None:
-            return False
-        result = gmapsclient.geocode(city)
-    return result is not None and len(result) > 0
-except Exception:  # Catch any exception during geocoding
-    return False
+        future.result(timeout=timeout)
+    except Exception:
+        pass # Fall back to the synchronous lookups
+# Geocoding results for a destination effectively never change, so they are memoized for a day
+# on the normalized destination string. The client is passed with a leading underscore so
+# that Streamlit does not try to hash it.
+# Only the location is needed, so "find_place" is used rather than a full geocode: it returns just
+# the requested fields, and its candidates have the same shape as geocode results.
+@st.cache_data(ttl=86400, show_spinner=False)
+def _geocode(destination_key, _gmapsclient):
+    def find():
+        result = _gmapsclient.find_place(destination_key, "textquery",
+                                         fields=["geometry/location", "place_id", "formatted_address"])
+        return result.get("candidates", [])
+    return _disk_cached(("geocode", destination_key), find)
+# A place name needs at least two consecutive letters (in any script), so empty, numeric or
+# punctuation-only input is rejected without spending a Maps request
+_PLACE_NAME_RE = re.compile(r"[^\W\d_]{2,}")
+def geocode_cached(destination, gmapsclient):
+    """
+    Geocodes a destination using the Google Maps API, serving repeated lookups from cache.
+    Args:
+        destination (str): The name of the destination to geocode.
+        gmapsclient (googlemaps.Client): An instance of the Google Maps API client.
+    Returns:
+        list: Matching places for the destination, each with `geometry.location`, `place_id`
+            and `formatted_address` (empty if it could not be found).
+    """
+    if not destination or not _PLACE_NAME_RE.search(destination):
+        return []
+    return _geocode(destination.strip().lower(), gmapsclient)
+# Decimal places that nearby-place lookups are rounded to before caching. Two decimals is a ~1.1km
+# cell, well inside the 3km (attractions) and 5km (lodging) search radii, so the results barely change.
+NEARBY_CELL_DECIMALS = 2
+# Search radii (in metres) tried in turn for nearby places, and the number of results that ends the search.
+# A page holds at most 20 results whatever the radius, so cities stop at the first radius, and only sparse
+# (e.g. rural) destinations pay for wider searches instead of getting an empty list.
+ATTRACTION_RADII = (3000, 10000, 25000)
+LODGING_RADII = (5000, 15000)
+MIN_NEARBY_RESULTS = 5
+# The radii and the minimum are part of the disk cache keys, so changing them does not serve stale results.
+# Number of top-ranked attractions kept for a destination, all of which are named in the itinerary prompt
+MAX_PROMPT_ATTRACTIONS = 8
+def _places_nearby_expanding(gmapsclient, lat, lng, place_type, radii):
+    # Returns the first page of results for the smallest radius that yields MIN_NEARBY_RESULTS places
+    results = []
+    for radius in radii:
+        results = gmapsclient.places_nearby(location=(lat, lng), radius=radius, type=place_type, rank_by='prominence', language='en')['results']
+        if len(results) >= MIN_NEARBY_RESULTS:
+            break
+    return results
+# Attractions around a point rarely change, so they are also memoized for a day. Streamlit computes each
+# cached value under a per-key lock, so concurrent callers for the same point wait for one API call.
+@st.cache_data(ttl=86400, show_spinner=False)
+def _nearby_attractions(lat, lng, _gmapsclient):
+    # Using the "places_nearby" API to get tourist attractions, within 3000m of the latitude-longitude of the chosen destination
+    # (widened for sparse areas). Only the first page is fetched; further pages each need a separate request after a forced delay.
+    places = _disk_cached(("nearby", "tourist_attraction", lat, lng, ATTRACTION_RADII, MIN_NEARBY_RESULTS),
+                          lambda: _places_nearby_expanding(_gmapsclient, lat, lng, 'tourist_attraction', ATTRACTION_RADII))
+    # Rank locally by rating weighted by review count, and keep only the top results used in the prompt
+    ranked = sorted(places, key=lambda place: place.get('rating', 0) * place.get('user_ratings_total', 0), reverse=True)
+    # Skip near-duplicate listings (e.g. "Tower of London" / "The Tower of London"), which only add prompt tokens
+    names, seen = [], set()
+    for place in ranked:
+        key = place['name'].strip().lower().removeprefix('the ')
+        if key not in seen:
+            seen.add(key)
+            names.append(place['name'])
+            if len(names) == MAX_PROMPT_ATTRACTIONS:
+                break
+    return names
 def get_attractions(destination, gmapsclient):
     """Fetches a list of tourist attractions near a given destination using the Google Maps API.
     Args:
         destination (dict): A dictionary containing latitude ('lat') and longitude ('lng') of the destination.
     Returns:
-        list[str]: A list of names of tourist attractions near the destination.
+        list[str]: A list of names of up to MAX_PROMPT_ATTRACTIONS of the best-reviewed tourist attractions near the destination.
                  Returns an empty list if no attractions are found.
     Raises:
         googlemaps.exceptions.ApiError: If there is an issue with the Google Maps API request.
@@ -91,7 +266,7 @@ def get_attractions(destination, gmapsclient):
     if isinstance(destination, str):
         # If destination is a string, geocode it first
         try:
-            geocode_result = gmapsclient.geocode(destination)
+            geocode_result = geocode_cached(destination, gmapsclient)
             if not geocode_result:
                 raise ValueError("Could not geocode destination")
             lat_lng = (geocode_result[0]['geometry']['location']['lat'], geocode_result[0]['geometry']['location']['lng'])
@@ -101,10 +276,10 @@ def get_attractions(destination, gmapsclient):
         # Destination is already a dict with lat/lng
         lat_lng = (destination['lat'], destination['lng'])
 
-    # Using the "places_nearby" API to get tourist attractions, within a 5000m radius, of the latitude-longitude of the chosen destination
+    # Nearby lookups are cached per ~1km cell (NEARBY_CELL_DECIMALS), so different spellings of the
+    # same city, whose centres differ slightly, share a result
     try:
-        places_result = gmapsclient.places_nearby(location=lat_lng, radius=5000, type='tourist_attraction', rank_by='prominence', language='en')
-        return [place['name'] for place in places_result['results']]
+        return _nearby_attractions(round(lat_lng[0], NEARBY_CELL_DECIMALS), round(lat_lng[1], NEARBY_CELL_DECIMALS), gmapsclient)
     except Exception:
         return []
 def get_accommodations(destination, gmapsclient):
@@ -128,18 +303,26 @@ def get_accommodations(destination, gmapsclient):
     try:
         # First, check if destination is a string (name) and geocode if needed
         if isinstance(destination, str):
-            geocode_result = gmapsclient.geocode(destination)
+            geocode_result = geocode_cached(destination, gmapsclient)
             if not geocode_result:
                 raise ValueError("Could not geocode destination")
             lat_lng = (geocode_result[0]['geometry']['location']['lat'], geocode_result[0]['geometry']['location']['lng'])
         else:
             lat_lng = (destination['lat'], destination['lng'])
-            
-    # Using places_nearby to get accommodation options within a 5000m radius
-    accommodations_result = gmapsclient.places_nearby(location=lat_lng, radius=5000, type='lodging', rank_by='prominence',language='en')
-    
+
+        return _nearby_lodging(round(lat_lng[0], NEARBY_CELL_DECIMALS), round(lat_lng[1], NEARBY_CELL_DECIMALS), gmapsclient)
+    except Exception:
+        return []
+# Lodging around a point is memoized like the attractions. Streamlit also holds a per-key lock while
+# computing a cached value, so concurrent reruns asking for the same point share a single API call.
+@st.cache_data(ttl=86400, show_spinner=False)
+def _nearby_lodging(lat, lng, _gmapsclient):
+    # Using places_nearby to get accommodation options within a 5000m radius (widened for sparse areas)
+    places = _disk_cached(("nearby", "lodging", lat, lng, LODGING_RADII, MIN_NEARBY_RESULTS),
+                          lambda: _places_nearby_expanding(_gmapsclient, lat, lng, 'lodging', LODGING_RADII))
+
     accommodations = []
-    for place in accommodations_result['results']:
+    for place in places:
         accommodation = {'name': place['name'],
                         'rating': place.get('rating', 'Not rated'),
                         'price_level': place.get('price_level', 'Price not available'),
@@ -148,10 +331,14 @@ def get_accommodations(destination, gmapsclient):
                         'types': place.get('types', [])
                         }
         accommodations.append(accommodation)
-    
-        return accommodations
+
+    return accommodations
 def get_available_hotels(destination, start_date, end_date, budget, total_travelers, gmaps_client, accommodation_type, accommodation_rating):
     """
+    Gets the hotels available for the trip dates within the lodging share of the budget.
+    Returns:
+        tuple: A tuple of (available_hotels, budget_breakdown, trip_duration).
+    """
     try:
         # Calculate trip duration
         trip_duration = (end_date - start_date).days
@@ -159,248 +346,55 @@ def get_available_hotels(destination, start_date, end_date, budget, total_travel
             trip_duration = 1
         
         # Calculate budget breakdown
-        budget_breakdown = {
-            'food': budget * 0.2,
-            'local_travel': budget * 0.3,
-            'tickets': budget * 0.2,
-            'lodging_budget': budget * 0.3
-        }
+        budget_breakdown = estimate_other_costs(budget)
         
         # Get available hotels (simplified - in real app, would integrate with hotel APIs)
         available_hotels = []
         return available_hotels, budget_breakdown, trip_duration
-    except Exception as e:
+    except Exception:
         return [], {}, 1
-def get_weather_data(destination, gmaps_client):
-    """
-    Gets weather data for destination (placeholder)
-    """
-    return "sunny"
-def get_refined_reply(chain, user_input, history):
-    """
-    Refines a travel itinerary based on user input and conversation history.
+# Weather is kept on disk for the same 10 minutes as in memory, so a restart does not refetch it
+@st.cache_data(ttl=600, show_spinner=False)
+def _current_weather(lat, lng, api_key):
+    def fetch():
+        resp = _session.get("https://api.openweathermap.org/data/2.5/weather",
+                            params={"lat": lat, "lon": lng, "appid": api_key},
+                            timeout=5)
+        resp.raise_for_status()
+        response = resp.json()
+        if response.get('weather'):
+            return response['weather'][0]['description']
+        else:
+            return "Weather data not available."
+    return _disk_cached(("weather", lat, lng), fetch, expire=600)
+def get_weather(destination, api_key):
+    """Fetches the current weather description for a given destination using OpenWeatherMap API.
     Args:
-        user_input (str): The latest request or input from the user.
-        history (list): An object that stores the conversation history, 
-            including messages from both the user and the AI.
+        destination (dict): A dictionary containing latitude ('lat') and longitude ('lng') of the destination.
+        api_key (str): The OpenWeather API key.
     Returns:
-        str: The refined travel itinerary generated by the AI.
-    Functionality:
-        - Constructs a prompt template for refining the itinerary based on the user's 
-          requests and the conversation history.
-        - Updates the conversation history with the user's latest input.
-        - Formats the conversation history into a structured format for the AI model.
-        - Uses an LLMChain to process the prompt and generate a refined itinerary.
-        - Updates the conversation history with the AI's response.
-    """
-    
-    # Format the conversation so far
-    if not history:
-        return ""
-    conversation = "\n".join(f"{'User' if msg.type == 'human' else 'AI'}: {msg.content}" for msg in history.messages)
-    response = chain.run(history=conversation, input=user_input)
-    return response
-def generate_itinerary(destination, no_of_adults, no_of_children, start_date, end_date, budget, interests, location, client, gmaps_client, openweather_key, available_hotels=None, budget_breakdown=None, trip_duration=None):
-    """
-    Generates a complete itinerary for the trip.
+        str: A string describing the current weather conditions (e.g., 'clear sky').
     """
+    # Weather changes over the day, so it is cached for a shorter window than the Places lookups
     try:
-    """
-    try:
-        # Calculate trip duration
-        if isinstance(start_date, str):
-            from datetime import datetime
-            start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
-        if isinstance(end_date, str):
-            from datetime import datetime
-            end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
-            
-        duration = (end_date - start_date).days
-        
-        # Fetching the tourist attractions for the destination
-        tourist_attraction = get_attractions(location, gmaps_client)
-
-        # Fetching the weather forecast for the destination
-        try:
-            # Simplified weather API call - in practice this would call an actual weather API
-            weather_forecast = get_weather_data(location, gmaps_client)
-        except Exception as e:
-            print(f"Warning: Could not fetch weather data: {e}")
-            weather_forecast = "Weather data not available"
-
-        # Get accommodation options
-        accommodations = available_hotels if available_hotels is not None else get_accommodations(location, gmaps_client)
-
-        # Format attractions for the prompt (handle case where attractions may be empty)
-        attractions_text = ", ".join(tourist_attraction) if tourist_attraction else "No specific attractions found"
-
-        # Prepare accommodation text for prompt
-        accommodation_text = ""
-        if accommodations:
-            accommodation_text = "Consider these accommodation options (sorted by reviews):\n"
-            for i, acc in enumerate(accommodations[:5], 1):  # Limit to top 5 options
-                price_level = "£" * acc.get('price_level', 1) if isinstance(acc.get('price_level'), int) else "Price unknown"
-                nightly = acc.get("estimated_nightly_rate")
-                total_stay = acc.get("estimated_total_stay_cost")
-                cost_text = ""
-                if nightly and total_stay and trip_duration:
-                    cost_text = f", Est. £{nightly}/night, Est. total £{total_stay:.0f} for {trip_duration} nights"
-                accommodation_text += f"{i}. {acc['name']} - Rating: {acc['rating']}, Reviews: {acc.get('user_ratings_total', 0)}, Price Level: {price_level}, Location: {acc['vicinity']}{cost_text}\n"
-        
-        if budget_breakdown:
-            accommodation_text += (
-                f"\nBudget guide: lodging budget ≈ £{budget_breakdown['lodging_budget']:.0f} "
-                f"after allocating food (£{budget_breakdown['food']:.0f}), local travel (£{budget_breakdown['local_travel']:.0f}), "
-                f"and tickets (£{budget_breakdown['tickets']:.0f}).\n"
-            )
-
-        prompt = f"""
-    You are a helpful tour planner.
-    Create a day-by-day itinerary, within 1000 words or less,
-    for a trip to {destination},
-    for {no_of_adults} adults and {no_of_children} children,
-    from {start_date} to {end_date},
-    within a budget of £{budget}, and 
-    with focus on the below interests {', '.join(interests)}.
-    Include places like, {attractions_text}, in the itinerary and
-    factor the forecasted weather, like {weather_forecast} while building the itinerary.
-    {accommodation_text}
-    
-    """
-        # Added budget anchoring in the prompt template to ensure the model adheres to the budget constraint.
-        prompt += f"STRICT RULE: Total cost MUST NOT exceed £{budget}. Prioritize free/cheap options first."  
-        response = client.chat.completions.create(model="gpt-3.5-turbo-0125",
-                                                  messages=[
-                                                              {
-                                                                  "role": "developer",
-                                                                  "content": prompt
-                                                              }
-                                                          ],
-                                                  max_tokens=1000,
-                                                  temperature=0)
-        return response.choices[0].message.content, prompt
-    except Exception as e:
-        raise Exception(f"Error generating itinerary: {e}")
-def suggest_accommodations(destination, start_date, end_date, total_budget, num_travelers, gmapsclient):
-# def get_refined_reply(chain, user_input, history):
-#     """
-#     Refines a travel itinerary based on user input and conversation history.
-#     Args:
-#         user_input (str): The latest request or input from the user.
-#         history (ConversationHistory): An object that stores the conversation history, 
-#             including messages from both the user and the AI.
-#     Returns:
-#         str: The refined travel itinerary generated by the AI.
-#     Functionality:
-#         - Constructs a prompt template for refining the itinerary based on the user's 
-#           requests and the conversation history.
-#         - Updates the conversation history with the user's latest input.
-#         - Formats the conversation history into a structured format for the AI model.
-#         - Uses an LLMChain to process the prompt and generate a refined itinerary.
-#         - Updates the conversation history with the AI's response.
-#     """
-    
-#     # Add the user's new request to memory
-#     history.add_user_message(user_input)
-#     # Format the conversation so far
-#     conversation = "\n".join(f"{'User' if msg.type == 'human' else 'AI'}: {msg.content}" for msg in history.messages)
-#     # Create the chain and run it
-#     refined_itinerary = chain.run(history=conversation, input=user_input)
-#     history.add_ai_message(refined_itinerary)
-#     return refined_itinerary
-    else:
+        return _current_weather(round(destination['lat'], 3), round(destination['lng'], 3), api_key)
+    except requests.RequestException:
+        # Failures are not cached, so the next generation tries again
         return "Weather data not available."
-    
-def suggest_accommodations(destination, start_date, end_date, total_budget, num_travelers, gmapsclient):
-    """
-    Suggests accommodation options based on trip details and budget constraints.
-    
-    Args:
-        destination (dict): A dictionary containing location data.
-        start_date (datetime.date): The start date of the trip.
-        end_date (datetime.date): The end date of the trip.
-        total_budget (float): Total budget for the trip in pounds (£).
-        num_travelers (int): Total number of travelers (adults + children).
-        gmapsclient (googlemaps.Client): Google Maps API client.
-        
-    Returns:
-        dict: A dictionary containing recommended accommodations and budget allocation info.
-    """
-    # Calculate trip duration
-    trip_duration = calculate_trip_duration(start_date, end_date)
-
-    # Allocate approximately 40-45% of total budget to accommodation after other costs
-    accommodation_budget = estimate_other_costs(total_budget)["lodging_budget"]
-    budget_per_night = accommodation_budget / trip_duration
-
-    # Adjust for number of travelers (assuming shared rooms)
-    room_factor = (num_travelers // 2) + (num_travelers % 2)  # Calculate rooms needed
-    budget_per_room = budget_per_night / room_factor
-
-    # Get accommodations
-    all_accommodations = get_accommodations(destination, gmapsclient)
-
-    # Filter and categorize accommodations
-    budget_options = []
-    mid_range_options = []
-    luxury_options = []
-
-    # Since Google Places API doesn't provide exact prices, use price_level as a proxy
-    for acc in all_accommodations:
-        price_level = acc.get('price_level', 2)  # Default to mid-range if not specified
-
-        if price_level in [1, 0]:
-            budget_options.append(acc)
-        elif price_level == 2:
-            mid_range_options.append(acc)
-        else:
-            luxury_options.append(acc)
-
-    # Determine which category fits the budget
-    recommended_category = "budget"
-    if budget_per_room >= 150:
-        recommended_category = "luxury"
-    elif budget_per_room >= 75:
-        recommended_category = "mid_range"
-
-    # Select recommendations based on budget category and ratings
-    recommendations = []
-
-    if recommended_category == "budget":
-        options = budget_options or mid_range_options or luxury_options
-    elif recommended_category == "mid_range":
-        options = mid_range_options or budget_options or luxury_options
-    else:
-        options = luxury_options or mid_range_options or budget_options
-
-    # Sort by rating and take top 3
-    sorted_options = sorted(options, key=lambda x: float(x.get('rating', 0) or 0), reverse=True)
-        return {"recommendations": recommendations,
-                "budget_info": {"total_budget": total_budget,
-                                "accommodation_budget": accommodation_budget,
-                                "budget_per_night": budget_per_night,
-                                "trip_duration": trip_duration
-                                }
-                }    
-
-def get_weather(location, api_key):
-    """
-    Gets weather data for a location (placeholder implementation).
-    In a real application, this would call a weather API.
-    """
-    return "sunny"
 
+# The same few trip dates are parsed on every rerun, so parsed values are memoized
+@functools.lru_cache(maxsize=256)
+def _parse_ymd(date_str):
+    return datetime.strptime(date_str, '%Y-%m-%d').date()
 def calculate_trip_duration(start_date, end_date):
     """
     Calculates the duration of a trip between two dates.
     """
     try:
         if isinstance(start_date, str):
-            from datetime import datetime
-            start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
+            start_date = _parse_ymd(start_date)
         if isinstance(end_date, str):
-            from datetime import datetime
-            end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
+            end_date = _parse_ymd(end_date)
         return (end_date - start_date).days
     except Exception:
         return 1
@@ -416,9 +410,39 @@ def estimate_other_costs(budget):
         'lodging_budget': budget * 0.3
     }
 
-# # Function to refine the itinerary based on user's requests
-def get_refined_reply(chain, user_input, history):
-    """
+# Prompt used by generate_itinerary(), built once at import and filled in with str.format.
+# The closing budget rule anchors the model to the budget constraint.
+# The itinerary prompt is split into fixed instructions, sent as the system message, and the trip
+# details, sent as the user message. The split only keeps the fixed instructions apart from the
+# per-trip data; the whole prompt is far below the size at which OpenAI's prompt caching applies.
+# The templates are kept flush-left and compact, since every character of indentation is tokenized and billed.
+_ITINERARY_SYSTEM_PROMPT = """You are a helpful tour planner.
+Create a day-by-day itinerary, within the length given by the user, for the trip described by the user.
+Focus on the user's interests, include the listed places and factor in the forecasted weather.
+Start with a section titled "RECOMMENDED ACCOMMODATION" listing 1-3 suitable options for the budget and trip details, each with its name, approximate price per night and a brief reason it's recommended (location to attractions, amenities, etc.).
+Prioritize free/cheap options first."""
+_ITINERARY_PROMPT = """Trip to {destination} for {no_of_adults} adults and {no_of_children} children, from {start_date} to {end_date}, budget £{budget}.
+Interests: {interests}.
+Places to include: {attractions_text}.
+Forecasted weather: {weather_forecast}.
+{accommodation_text}
+Length: about {max_words} words in total.
+STRICT RULE: Total cost MUST NOT exceed £{budget}."""
+# Fingerprint of the prompt templates, included in the trip cache key so that itineraries stored on disk
+# are not served after the prompts change
+ITINERARY_PROMPT_VERSION = hashlib.sha256((_ITINERARY_SYSTEM_PROMPT + _ITINERARY_PROMPT).encode()).hexdigest()[:16]
+# Google price levels (0-4) as shown in the prompt
+_PRICE_LEVEL_TEXT = ("", "£", "££", "£££", "££££")
+# Completion token budget: a fixed allowance for the accommodation section plus a per-day allowance,
+# capped overall. Short trips stop generating (and billing) sooner.
+ITINERARY_BASE_TOKENS = 200
+ITINERARY_TOKENS_PER_DAY = 150
+ITINERARY_MAX_TOKENS = 1000
+# The prompt asks for a word count that fits inside that budget. A token is roughly 0.75 English words;
+# asking for fewer leaves headroom for the markdown, so the reply ends before it is cut off.
+ITINERARY_WORDS_PER_TOKEN = 0.6
+# Function to generate the itinerary for the trip
+def generate_itinerary(destination, no_of_adults, no_of_children, start_date, end_date, budget, interests, location, llm, gmapsclient, openweather_api_key, available_hotels=None, budget_breakdown=None, trip_duration=None, completion_info=None):
     """Generates a day-by-day travel itinerary for a specified destination, date range, budget, and interests.
 
     Args:
@@ -429,40 +453,45 @@ def get_refined_reply(chain, user_input, history):
         end_date (str): The end date of the trip in YYYY-MM-DD format.
         budget (float): The budget for the trip in GBP (£).
         interests (list of str): A list of interests to focus on during the trip (e.g., "history", "adventure").
+        completion_info (dict, optional): Receives the completion's `finish_reason` once it has streamed
+            (see `stream_completion`).
 
     Returns:
-        str: A detailed day-by-day itinerary as a string, considering the destination's tourist attractions,
-             weather forecast, and user preferences.
-
-    Returns:
-        str: A detailed day-by-day itinerary as a string, considering the destination's tourist attractions,
-             weather forecast, and user preferences.
+        tuple: A tuple of (itinerary_stream, prompt), where itinerary_stream yields the itinerary text
+               in chunks as it is generated (suitable for `st.write_stream`) and prompt is the trip details
+               sent to the model as the user message.
     Notes:
         - Uses Google Maps API to fetch latitude and longitude for the destination.
         - Retrieves tourist attractions and weather forecast using external APIs.
         - Leverages OpenAI's GPT model to generate the itinerary based on the provided inputs."""
 
-    # Fetching the tourist attractions for the destination
-    tourist_attraction = get_attractions(location, gmapsclient)
+    # Fetching the tourist attractions, the weather forecast and, if no hotels were passed in, the
+    # accommodation options for the destination. The lookups are independent, so they are issued concurrently.
+    attractions_future = _submit_io(get_attractions, location, gmapsclient)
+    weather_future = _submit_io(get_weather, location, openweather_api_key)
+    accommodations_future = _submit_io(get_accommodations, location, gmapsclient) if available_hotels is None else None
+    tourist_attraction, weather_forecast = attractions_future.result(), weather_future.result()
 
-    # Fetching the weather forecast for the destination
-    weather_forecast = get_weather(location, openweather_api_key)
+    # Format attractions for the prompt (handle case where attractions may be empty)
+    attractions_text = ", ".join(tourist_attraction) if tourist_attraction else "No specific attractions found"
 
     # Get accommodation options
-    accommodations = available_hotels if available_hotels is not None else get_accommodations(location, gmapsclient)
+    accommodations = available_hotels if accommodations_future is None else accommodations_future.result()
 
-    # Format accommodations for the prompt
-    accommodation_text = ""
+    # Format accommodations for the prompt, collecting the lines and joining them once
+    accommodation_lines = []
     if accommodations:
-        accommodation_text = "Consider these accommodation options (sorted by reviews):\n"
+        accommodation_lines.append("Consider these accommodation options (sorted by reviews):")
         for i, acc in enumerate(accommodations[:5], 1):  # Limit to top 5 options
-            price_level = "£" * acc.get('price_level', 1) if isinstance(acc.get('price_level'), int) else "Price unknown"
+            level = acc.get('price_level')
+            price_level = _PRICE_LEVEL_TEXT[level] if isinstance(level, int) and 0 <= level < len(_PRICE_LEVEL_TEXT) else "Price unknown"
             nightly = acc.get("estimated_nightly_rate")
             total_stay = acc.get("estimated_total_stay_cost")
             cost_text = ""
             if nightly and total_stay and trip_duration:
                 cost_text = f", Est. £{nightly}/night, Est. total £{total_stay:.0f} for {trip_duration} nights"
-            accommodation_text += f"{i}. {acc['name']} - Rating: {acc['rating']}, Reviews: {acc.get('user_ratings_total', 0)}, Price Level: {price_level}, Location: {acc['vicinity']}{cost_text}\n"
+            accommodation_lines.append(f"{i}. {acc['name']} - Rating: {acc['rating']}, Reviews: {acc.get('user_ratings_total', 0)}, Price Level: {price_level}, Location: {acc['vicinity']}{cost_text}")
+    accommodation_text = "\n".join(accommodation_lines) + "\n" if accommodation_lines else ""
 
     if budget_breakdown:
         accommodation_text += (
@@ -471,71 +500,86 @@ def get_refined_reply(chain, user_input, history):
             f"and tickets (£{budget_breakdown['tickets']:.0f}).\n"
         )
 
-    prompt = f"""
-    You are a helpful tour planner.
-    Create a day-by-day itinerary, within 1000 words or less,
-    for a trip to {destination},
-    for {no_of_adults} adults and {no_of_children} children,
-    from {start_date} to {end_date},
-    within a budget of £{budget}, and 
-    with focus on the below interests {', '.join(interests)}.
-    Include places like, {tourist_attraction}, in the itinerary and
-    factor the forecasted weather, like {weather_forecast} while building the itinerary.
-
-    {accommodation_text}
-    
-    Start the itinerary with a section titled "RECOMMENDED ACCOMMODATION" that lists 1-3 suitable options based on the budget and trip details.
-    For each accommodation, include the name, approximate price per night, and a brief explanation of why it's recommended (location to attractions, amenities, etc.)
-
+    # Trip days are inclusive of both the start and end date
+    num_days = calculate_trip_duration(start_date, end_date) + 1
+    max_tokens = min(ITINERARY_BASE_TOKENS + ITINERARY_TOKENS_PER_DAY * num_days, ITINERARY_MAX_TOKENS)
+
+    # Interests are sorted so the same selection always produces the same prompt (and a cache hit)
+    prompt = _ITINERARY_PROMPT.format(destination=destination,
+                                      no_of_adults=no_of_adults,
+                                      no_of_children=no_of_children,
+                                      start_date=start_date,
+                                      end_date=end_date,
+                                      budget=budget,
+                                      interests=", ".join(sorted(interests)),
+                                      attractions_text=attractions_text,
+                                      weather_forecast=weather_forecast,
+                                      accommodation_text=accommodation_text,
+                                      max_words=int(round(max_tokens * ITINERARY_WORDS_PER_TOKEN, -1)))
+
+    return stream_completion(prompt, llm, max_tokens, completion_info), prompt
+# Completions are requested with temperature=0, so an identical prompt yields the same itinerary.
+# Finished completions are kept in a dict keyed by a digest of the model, token limit and prompt,
+# which is dropped after 24 hours.
+@st.cache_resource(ttl=86400)
+def _completion_store():
+    return {}
+def stream_completion(prompt, llm, max_tokens=ITINERARY_MAX_TOKENS, completion_info=None):
     """
-    # Added budget anchoring in the prompt template to ensure the model adheres to the budget constraint.
-    prompt += f"STRICT RULE: Total cost MUST NOT exceed £{budget}. Prioritize free/cheap options first."  
-
-    response = openaiclient.chat.completions.create(model="gpt-3.5-turbo-0125",
-                                                    messages=[
-                                                                {
-                                                                    "role": "developer",
-                                                                    "content": prompt
-                                                                }
-                                                            ],
-                                                    max_tokens=1000,
-                                                    temperature=0)
-    return response.choices[0].message.content, prompt
-# # Function to refine the itinerary based on user's requests
-def get_refined_reply(chain, user_input, history):
+    Streams the itinerary completion for a prompt, chunk by chunk, as the model generates it.
+    A previously completed response for the same prompt is replayed from cache instead.
+    Args:
+        prompt (str): The formatted trip details, sent after the fixed itinerary instructions.
+        llm (ChatOpenAI): The LangChain chat model, which shares its HTTP connection pool with the refine chain.
+        max_tokens (int, optional): The maximum number of tokens to generate.
+        completion_info (dict, optional): Receives the model's `finish_reason` once the stream ends
+            ("length" if the reply was cut off at max_tokens); left empty for a cached reply.
+    Yields:
+        str: Successive pieces of the itinerary text.
     """
-    Refines a travel itinerary based on user input and conversation history.
+    store = _completion_store()
+    key = hashlib.blake2b(f"{llm.model_name}|{max_tokens}|{prompt}".encode(), digest_size=16).hexdigest()
+    if key in store:
+        yield store[key]
+        return
+    chunks = []
+    finish_reason = None
+    for chunk in llm.stream([("system", _ITINERARY_SYSTEM_PROMPT), ("human", prompt)], max_tokens=max_tokens):
+        chunks.append(chunk.content)
+        finish_reason = chunk.response_metadata.get("finish_reason") or finish_reason
+        yield chunk.content
+    if completion_info is not None:
+        completion_info["finish_reason"] = finish_reason
+    # Only cache completions that streamed to the end and were not cut off by the token limit
+    if finish_reason != "length":
+        store[key] = "".join(chunks)
+# ----------------------------------------trip cache--------------------------------------------------------------------------------------------------------------
+def trip_cache_key(*parts):
+    """
+    Builds a stable key for the on-disk trip cache from the trip parameters.
+    A refinement turn is keyed by passing the previous key and the user's request, so each key
+    identifies the whole conversation that led to an itinerary.
     Args:
-        user_input (str): The latest request or input from the user.
-        history (list): A list of conversation messages.
+        *parts: Values identifying the trip, e.g. destination, dates, budget and sorted interests.
     Returns:
-        str: The refined travel itinerary generated by the AI.
+        str: A SHA-256 hex digest of the parts.
     """
-    # Format the conversation so far
-    conversation = "\n".join(f"{'User' if msg.type == 'human' else 'AI'}: {msg.content}" for msg in history.messages)
-    
-    # Get refined reply through the chain
-    response = chain.run(history=conversation, input=user_input)
-    return response
-#     return refined_itinerary
-    
-    # Function to get user feedback on itinerary
-def get_user_feedback():
+    return hashlib.sha256(repr(parts).encode()).hexdigest()
+def load_cached_trip(key):
+    """
+    Returns the cached value for a trip cache key, or None if it is missing or expired.
+    """
+    return _disk_cache.get(key)
+def store_cached_trip(key, value):
     """
-    Function to get user feedback on the itinerary.
-    This would typically be integrated with UI elements.
+    Stores a value in the trip cache for `TRIP_CACHE_TTL` seconds.
     """
-    st.markdown("### How would you like to modify your itinerary?")
-    feedback_options = [
-        "Make it more budget-friendly",
-        "Add more family activities",
-        "Include more cultural experiences",
-        "Focus on outdoor activities",
-        "Modify the schedule",
-        "Other (please specify)"
-    ]
-    user_choice = st.selectbox("Select a modification option:", feedback_options)
-    if user_choice == "Other (please specify)":
-        custom_input = st.text_input("Please describe your specific request:")
-        return custom_input
-    return user_choice
+    _disk_cache.set(key, value, expire=TRIP_CACHE_TTL)
+# Number of most recent messages sent back to the model on each refinement. The latest AI
+# message always holds the current itinerary, so older turns can be dropped without losing it,
+# and the refine prompt stays bounded instead of growing with every turn.
+MAX_HISTORY_MESSAGES = 6
+# Token budget for that history. A few long itineraries can still be large, so the turns before the
+# latest itinerary (which is always kept) are dropped further until they fit, well inside the model's
+# context window.
+MAX_HISTORY_TOKENS = 8000
@@ -17,7 +17,7 @@ Modules and Functions:
     - Validates user inputs for destination, travel dates, budget, and interests.
     - Uses Google Maps API to validate the destination city.
     - Returns a list of errors (if any) and geocoding results.
-4. **handle_initial_generation(destination, start_date, end_date, budget, interests, geocode_result, client, gmaps_client, openweather_key)**:
+4. **handle_initial_generation(destination, start_date, end_date, budget, interests, geocode_result, gmaps_client, openweather_key)**:
     - Generates the initial itinerary using user inputs and external APIs.
     - Updates session state with the generated itinerary and resets conversation history.
 5. **render_results_and_refinement()**:
@@ -25,7 +25,7 @@ Modules and Functions:
     - Handles user input for refinement and triggers the refinement process.
 6. **main()**:
     - Entry point for the Streamlit application.
-    - Configures the page layout, handles user input, validates inputs, generates the initial 
+    - Handles user input, validates inputs, generates the initial 
       itinerary, and provides options for refinement.
 -------------
 - Streamlit: For UI rendering and interaction.
@@ -53,131 +53,162 @@ Usage:
 # -------------------------------------------------------------------------------------------------------------------------------------------------------------
 
 # Import necessary libraries
+import threading
 import streamlit as st
-# Import necessary Langchain and OpenAI components
-from langchain_community.chat_message_histories import ChatMessageHistory
-from langchain.prompts import ChatPromptTemplate
-from langchain.chains import LLMChain
-from langchain_openai import ChatOpenAI
-from openai import OpenAI
-from functions import *
 
-# --- Global Configuration & Initialization ---
-try:
-    # --- Configuration ---
-    try:
-        OPENAI_API_KEY = st.secrets["OPENAI_API_KEY"]
-        googlemaps_api_key = st.secrets["googlemaps_api_key"]
-        openweather_api_key = st.secrets["openweather_api_key"]
-    except KeyError as e:
-        st.error(f"Missing secret: {e}. Please configure secrets.")
-        st.stop() # Stop execution if secrets are missing
-
-    # --- Initialize Session State ---
-    # Use session state to store history and generation status (runs only once per session)
-    if 'history' not in st.session_state:
-       st.session_state.history = ChatMessageHistory()
-   if 'itinerary_generated' not in st.session_state:
-       st.session_state.itinerary_generated = False
-    if 'current_itinerary' not in st.session_state:
-       st.session_state.current_itinerary = "" # Store the latest itinerary text
-   if 'available_hotels' not in st.session_state:
-       st.session_state.available_hotels = []
-    if 'budget_breakdown' not in st.session_state:
-        st.session_state.budget_breakdown = None
-    if 'trip_duration' not in st.session_state:
-        st.session_state.trip_duration = None
-    if 'show_hotels' not in st.session_state:
-        st.session_state.show_hotels = False
-
-    # --- LLM and Prompt Setup ---
-   # Using OpenAI "gpt-3.5-turbo-0125" model
-   try:
-       llm = ChatOpenAI(model="gpt-3.5-turbo-0125", temperature=0, api_key=OPENAI_API_KEY)
-        client = OpenAI(api_key=OPENAI_API_KEY) # OpenAI client for other potential uses
-       gmaps = googlemaps.Client(key=googlemaps_api_key) # Google Maps client
-   except Exception as e:
-       st.error(f"Error initializing API clients: {e}")
-        st.stop() # Stop execution if clients fail to initialize
+# Paint the page header before anything else is imported or constructed
+st.set_page_config(page_title="AI Trip Planner", page_icon=":airplane:", layout="wide")
+st.title("AI Trip Planner")
 
-    # Generating a new prompt template to handle conversation history
-    conversation_prompt = ChatPromptTemplate.from_messages([("system", "You are a helpful travel planning assistant. Refine the itinerary based on the user's requests and the previous conversation history."),
-                                                            ("placeholder", "{history}"), # Use placeholder for Langchain >= 0.1.0
-                                                            ("human", "{input}"),
-                                                            ])
-    
-    # Create the chain (do this once)
-    refine_chain = LLMChain(llm=llm, prompt=conversation_prompt)
+from functions import (ITINERARY_PROMPT_VERSION, MAX_HISTORY_MESSAGES, MAX_HISTORY_TOKENS, generate_itinerary,
+                       geocode_cached, get_available_hotels, load_cached_trip, make_gmaps_client, render_input_form,
+                       store_cached_trip, trip_cache_key, wait_for_prefetch)
+# The Langchain and OpenAI components are imported where they are used, since their import
+# graph is heavy and would otherwise delay the first render of the page
 
-except KeyError as e:
-    st.error(f"CRITICAL ERROR: Missing secret: {e}. Please configure secrets in Streamlit.")
-    st.stop() # Stop execution if secrets are missing during initial load
-except Exception as e:
-    st.error(f"CRITICAL ERROR during initialization: {e}")
-    st.stop() # Stop execution on other critical init errors   
+# OpenAI model used for both the itinerary and the refinements; also part of the trip cache key
+LLM_MODEL = "gpt-4o-mini"
 
-#-----------------------------------------generate_refined_plan()--------------------------------------------------------------------------------------------------------------
-# Function to generate a refined trip plan based on user input
-def generate_refined_plan(user_input):
+# ----------------------------------------get_gmaps_client()--------------------------------------------------------------------------------------------------------------
+# Function to build the Google Maps client once per process
+@st.cache_resource
+def get_gmaps_client(googlemaps_api_key):
     """
-    Generates a refined trip plan based on user input and conversation history.
-    This function interacts with an AI model or API to refine a trip itinerary. 
-    It uses the session state to maintain conversation history and updates the 
-    current itinerary. The refined itinerary is displayed to the user.
+    Builds the Google Maps client, cached with `st.cache_resource` so it is shared across reruns
+    and sessions. Its requests go through the same pooled HTTP session as the OpenWeather calls.
+
     Args:
-        user_input (str): The user's input or request for refining the trip plan.
-    Workflow:
-        1. Retrieves the conversation history from the session state.
-        2. Invokes the refinement chain with the history and user input.
-        3. Extracts the refined itinerary from the chain's response.
-        4. Updates the session state with the user's input and AI's response.
-        5. Updates the current itinerary in the session state.
-        6. Displays the refined itinerary to the user.
-    Notes:
-        - Ensure that `refine_chain` is properly initialized and compatible with the expected input/output format.
-        - The session state must have `history` and `current_itinerary` keys initialized before calling this function.
-        - Optional: Uncomment the section to display the full conversation history.
-    Raises:
-        KeyError: If required keys are missing in the session state.
-        Exception: If the refinement chain invocation fails or returns an unexpected response.
+        googlemaps_api_key (str): The API key for Google Maps.
+
+    Returns:
+        googlemaps.Client: The Google Maps client.
     """
-    # Call the AI model and APIs here
-    with st.spinner("Generating your refined trip plan..."):
+    return make_gmaps_client(googlemaps_api_key)
 
-        # Use history from session state
-        history_langchain_format = st.session_state.history.messages
+# ----------------------------------------get_llm_clients()--------------------------------------------------------------------------------------------------------------
+# Function to build the LLM and the refinement chain once per process
+@st.cache_resource
+def get_llm_clients(openai_api_key):
+    """
+    Builds the LangChain LLM and refinement chain.
 
-        # Get refined reply using the chain
-        # Note: Ensure get_refined_reply is adapted if needed, or use the chain directly
-        # refined_itinerary = get_refined_reply(refine_chain, user_input, history_langchain_format) # If get_refined_reply is a wrapper
-        # Or directly invoke the chain:
-        response = refine_chain.invoke({"history": history_langchain_format,"input": user_input})
-        
-        refined_itinerary = response['text'] # Adjust based on actual chain output key
+    Streamlit reruns this script on every widget interaction, so the clients are cached with
+    `st.cache_resource` and shared across reruns and sessions. This keeps their HTTP
+    connection pools alive instead of rebuilding them on every rerun.
 
-        # Add user input and AI response to session state history
-        st.session_state.history.add_user_message(user_input)
-        st.session_state.history.add_ai_message(refined_itinerary)
+    Args:
+        openai_api_key (str): The API key for OpenAI.
 
-        # Update the current itinerary in session state
-        st.session_state.current_itinerary = refined_itinerary
+    Returns:
+        tuple: A tuple of (llm, refine_chain).
+    """
+    from langchain_core.prompts import ChatPromptTemplate
+    from langchain_core.messages import trim_messages
+    from langchain_core.output_parsers import StrOutputParser
+    from langchain_core.runnables import RunnablePassthrough
+    from langchain_core.runnables.history import RunnableWithMessageHistory
+    from langchain_openai import ChatOpenAI
+
+    # No global LangChain LLM cache is installed: both the itinerary and the refinements are streamed,
+    # and stream() bypasses it. Repeated prompts are served by stream_completion's store and the trip cache.
+
+    # Using OpenAI "gpt-4o-mini" model, which is cheaper and faster than gpt-3.5-turbo.
+    # The SDK retries 429/5xx responses with jittered exponential backoff, honouring Retry-After;
+    # allow one more attempt than its default of 2.
+    llm = ChatOpenAI(model=LLM_MODEL, temperature=0, api_key=openai_api_key, max_retries=3)
+    # Pre-warm the connection with a free models.list() call in the background, so the TLS
+    # handshake is already done by the time the user first clicks "Generate Plan"
+    threading.Thread(target=lambda: llm.root_client.models.list(), daemon=True).start()
+
+    # Generating a new prompt template to handle conversation history
+    conversation_prompt = ChatPromptTemplate.from_messages([("system", "You are a helpful travel planning assistant. Refine the itinerary based on the user's requests and the previous conversation history."),
+                                                            ("placeholder", "{history}"), # Use placeholder for Langchain >= 0.1.0
+                                                            ("human", "{input}"),
+                                                            ])
 
-        # Display the latest refined itinerary (optional: display full history too)
-        st.markdown("### Refined Itinerary")
-        st.write(st.session_state.current_itinerary)
+    # Only the most recent messages are passed to the prompt, so it does not grow with every turn.
+    # The latest AI message holds the itinerary being refined, so it is always kept in full; the turns
+    # before it are trimmed to the rest of the token budget (counted with the model's tokenizer),
+    # starting on a user turn.
+    def trim_history(messages):
+        messages = messages[-MAX_HISTORY_MESSAGES:]
+        last_ai = max((i for i, m in enumerate(messages) if m.type == "ai"), default=None)
+        if last_ai is None:
+            return trim_messages(messages, max_tokens=MAX_HISTORY_TOKENS, token_counter=llm, strategy="last", start_on="human")
+        current = messages[last_ai:]
+        budget = MAX_HISTORY_TOKENS - llm.get_num_tokens_from_messages(current)
+        older = trim_messages(messages[:last_ai], max_tokens=budget, token_counter=llm, strategy="last", start_on="human") if budget > 0 else []
+        return older + current
+
+    # Create the chain (do this once) as an LCEL pipeline that returns the reply as a plain string
+    base_chain = (RunnablePassthrough.assign(history=lambda x: trim_history(x["history"]))
+                  | conversation_prompt
+                  | llm
+                  | StrOutputParser())
+    # The wrapper reads the session's history before each call and records the new turn after it.
+    # The lookup happens at call time, so the cached chain still uses each session's own history.
+    refine_chain = RunnableWithMessageHistory(base_chain,
+                                              lambda session_id: st.session_state.history,
+                                              input_messages_key="input",
+                                              history_messages_key="history")
+    return llm, refine_chain
+
+# ----------------------------------------load_llm_clients()--------------------------------------------------------------------------------------------------------------
+# Function to fetch the cached LLM clients, stopping the app if they cannot be built
+def load_llm_clients():
+    """
+    Returns the cached (llm, refine_chain) pair, building it on first use.
 
-        # Optional: Display full conversation history
-        # st.markdown("### Full Conversation History")
-        # full_conversation = "\n\n".join([f"User: {msg.content}" if msg.type == 'human' else f"AI: {msg.content}" for msg in st.session_state.history.messages])
-        # st.text_area("Conversation History", full_conversation, height=300, key="conversation_history_display")        
-   # Create the chain (do this once)
-   refine_chain = LLMChain(llm=llm, prompt=conversation_prompt)
-except KeyError as e:
-    st.error(f"CRITICAL ERROR: Missing secret: {e}. Please configure secrets in Streamlit.")
-    st.stop() # Stop execution if secrets are missing during initial load
+    The LLM clients are not built at import time, so the page renders before their
+    construction. Shows an error and stops the app if they fail to initialize.
+
+    Returns:
+        tuple: A tuple of (llm, refine_chain).
+    """
+    try:
+        return get_llm_clients(OPENAI_API_KEY)
+    except Exception as e:
+        st.error(f"Error initializing API clients: {e}")
+        st.stop() # Stop execution if clients fail to initialize
+
+# --- Global Configuration & Initialization ---
+# --- Configuration ---
+try:
+    OPENAI_API_KEY = st.secrets["OPENAI_API_KEY"]
+    googlemaps_api_key = st.secrets["googlemaps_api_key"]
+    openweather_api_key = st.secrets["openweather_api_key"]
+except (KeyError, FileNotFoundError) as e: # FileNotFoundError if there is no secrets.toml at all
+    st.error(f"Missing secret: {e}. Please configure secrets.")
+    st.stop() # Stop execution if secrets are missing
+
+# --- Initialize Session State ---
+# Use session state to store history and generation status (runs only once per session)
+if 'history' not in st.session_state:
+    from langchain_community.chat_message_histories import ChatMessageHistory
+    st.session_state.history = ChatMessageHistory()
+if 'itinerary_generated' not in st.session_state:
+    st.session_state.itinerary_generated = False
+if 'current_itinerary' not in st.session_state:
+    st.session_state.current_itinerary = "" # Store the latest itinerary text
+if 'available_hotels' not in st.session_state:
+    st.session_state.available_hotels = []
+if 'budget_breakdown' not in st.session_state:
+    st.session_state.budget_breakdown = None
+if 'trip_duration' not in st.session_state:
+    st.session_state.trip_duration = None
+if 'show_hotels' not in st.session_state:
+    st.session_state.show_hotels = False
+if 'trip_key' not in st.session_state:
+    st.session_state.trip_key = None # Trip cache key of the current itinerary
+
+# --- Google Maps Client ---
+# Cheap to construct (no network), and needed by the form's destination prefetch.
+# The LLM clients are built lazily through load_llm_clients().
+try:
+    gmaps = get_gmaps_client(googlemaps_api_key)
 except Exception as e:
-    st.error(f"CRITICAL ERROR during initialization: {e}")
-    st.stop() # Stop execution on other critical init errors   
+    st.error(f"Error initializing API clients: {e}")
+    st.stop() # Stop execution if clients fail to initialize
 
 #-----------------------------------------generate_refined_plan()--------------------------------------------------------------------------------------------------------------
 # Function to generate a refined trip plan based on user input
@@ -190,12 +221,11 @@ def generate_refined_plan(user_input):
     Args:
         user_input (str): The user's input or request for refining the trip plan.
     Workflow:
-        1. Retrieves the conversation history from the session state.
-        2. Invokes the refinement chain with the history and user input.
-        3. Extracts the refined itinerary from the chain's response.
-        4. Updates the session state with the user's input and AI's response.
-        5. Updates the current itinerary in the session state.
-        6. Displays the refined itinerary to the user.
+        1. Streams the refinement chain with the user input; the chain pulls the most recent
+           conversation history from the session state.
+        2. Displays the refined itinerary as it arrives.
+        3. The chain records the user's input and AI's response in the session state history.
+        4. Updates the current itinerary in the session state.
     Notes:
         - Ensure that `refine_chain` is properly initialized and compatible with the expected input/output format.
         - The session state must have `history` and `current_itinerary` keys initialized before calling this function.
@@ -207,28 +237,27 @@ def generate_refined_plan(user_input):
     # Call the AI model and APIs here
     with st.spinner("Generating your refined trip plan..."):
 
-        # Use history from session state
-        history_langchain_format = st.session_state.history.messages
-
-        # Get refined reply using the chain
-        # Note: Ensure get_refined_reply is adapted if needed, or use the chain directly
-        # refined_itinerary = get_refined_reply(refine_chain, user_input, history_langchain_format) # If get_refined_reply is a wrapper
-        # Or directly invoke the chain:
-        response = refine_chain.invoke({"history": history_langchain_format,"input": user_input})
-        
-        refined_itinerary = response['text'] # Adjust based on actual chain output key
-
-        # Add user input and AI response to session state history
-        st.session_state.history.add_user_message(user_input)
-        st.session_state.history.add_ai_message(refined_itinerary)
+        st.markdown("## Refined Itinerary")
+        # The key chains on the previous turn's key, so it identifies the whole conversation so far
+        refine_key = trip_cache_key(st.session_state.trip_key, user_input)
+        refined_itinerary = load_cached_trip(refine_key)
+        if refined_itinerary is not None:
+            # Replay a refinement already made for this exact conversation, and record the turn
+            st.write(refined_itinerary)
+            st.session_state.history.add_user_message(user_input)
+            st.session_state.history.add_ai_message(refined_itinerary)
+        else:
+            # Stream the chain directly, so the refined itinerary is shown token by token.
+            # The chain reads the history from session state and adds this turn to it once the stream completes.
+            _, refine_chain = load_llm_clients()
+            refined_itinerary = st.write_stream(refine_chain.stream({"input": user_input},
+                                                                    config={"configurable": {"session_id": "default"}}))
+            store_cached_trip(refine_key, refined_itinerary)
+        st.session_state.trip_key = refine_key
 
         # Update the current itinerary in session state
         st.session_state.current_itinerary = refined_itinerary
 
-        # Display the latest refined itinerary (optional: display full history too)
-        st.markdown("## Refined Itinerary")
-        st.write(st.session_state.current_itinerary)
-
         # Optional: Display full conversation history
         # st.markdown("## Full Conversation History")
         # full_conversation = "\n\n".join([f"User: {msg.content}" if msg.type == 'human' else f"AI: {msg.content}" for msg in st.session_state.history.messages])
@@ -237,6 +266,8 @@ def generate_refined_plan(user_input):
 # ----------------------------------------validate_user_inputs()--------------------------------------------------------------------------------------------------------------
 # Function to validate user inputs
 def validate_user_inputs(destination, start_date, end_date, budget, interests, gmaps_client):
+    """
+    Validates user inputs for the trip planner.
 
     This function checks the validity of the provided destination, travel dates, budget, 
     and interests. It also attempts to geocode the destination using the provided Google 
@@ -260,32 +291,35 @@ def validate_user_inputs(destination, start_date, end_date, budget, interests, g
     errors = []
     geocode_result = None
 
-   if not destination:
-       errors.append("Please enter a destination.")
-   if not start_date or not end_date:
+    if not destination:
+        errors.append("Please enter a destination.")
+    if not start_date or not end_date:
         errors.append("Please select start and end dates.")
-   elif start_date > end_date:
-       errors.append("Start date must be before end date.")
-   if budget <= 0:
+    elif start_date > end_date:
+        errors.append("Start date must be before end date.")
+    if budget <= 0:
         errors.append("Budget must be greater than zero.")
     if not interests:
         errors.append("Please select at least one interest.")
 
-    # Only attempt geocoding if destination is provided and other basic checks pass
-    if destination and not errors:
-        try:
-            geocode_result = is_valid_city(destination, gmaps_client)
-            if not geocode_result:
-                errors.append("Invalid destination. Please enter a valid city name.")
-        except Exception as e: # Consider more specific exceptions if known
-            st.error(f"Error validating destination: {e}") # Show immediate error for API issues
-            errors.append(f"Could not validate destination: {destination}.") # Add to list
+    # Return before any network call if the local checks already failed
+    if errors:
+        return errors, None
+
+    # Geocoding is cached per destination, so resubmitting after fixing a local error is free
+    try:
+        geocode_result = geocode_cached(destination, gmaps_client)
+        if not geocode_result:
+            errors.append("Invalid destination. Please enter a valid city name.")
+    except Exception as e: # Consider more specific exceptions if known
+        st.error(f"Error validating destination: {e}") # Show immediate error for API issues
+        errors.append(f"Could not validate destination: {destination}.") # Add to list
 
     return errors, geocode_result
 
 # ----------------------------------------handle_initial_generation()--------------------------------------------------------------------------------------------------------------
 # Function to handle the initial itinerary generation
-def handle_initial_generation(destination, no_of_adults, no_of_children, start_date, end_date, budget, interests, geocode_result, client, gmaps_client, openweather_key, accommodation_type, accommodation_rating, show_hotels):
+def handle_initial_generation(destination, no_of_adults, no_of_children, start_date, end_date, budget, interests, geocode_result, gmaps_client, openweather_key, accommodation_type, accommodation_rating, show_hotels):
     """
     Generates the initial itinerary for a trip, handles potential errors, and updates the session state.
 
@@ -301,7 +335,6 @@ def handle_initial_generation(destination, no_of_adults, no_of_children, start_d
         budget (float): The budget for the trip.
         interests (list): A list of user interests to tailor the itinerary.
         geocode_result (list): Geocoding result containing location data for the destination.
-        client (object): The client object for interacting with the itinerary generation service.
         gmaps_client (object): The Google Maps client for geocoding and location data.
         openweather_key (str): The API key for accessing OpenWeather services.
 
@@ -312,6 +345,7 @@ def handle_initial_generation(destination, no_of_adults, no_of_children, start_d
         - `st.session_state.itinerary_generated` (bool): Indicates whether the itinerary was successfully generated.
         - `st.session_state.history` (ChatMessageHistory): Resets and updates the chat history with the new itinerary.
         - `st.session_state.current_itinerary` (str): Stores the generated itinerary.
+        - `st.session_state.trip_key` (str): The trip cache key of the generated itinerary.
 
     Notes:
         - If location data cannot be extracted from `geocode_result`, the function stops execution and displays an error.
@@ -346,27 +380,51 @@ def handle_initial_generation(destination, no_of_adults, no_of_children, start_d
                     accommodation_rating,
                 )
 
-            itinerary, user_input = generate_itinerary(destination,
-                                                       no_of_adults, 
-                                                       no_of_children,
-                                                       start_date,
-                                                       end_date,
-                                                       budget,
-                                                       interests,
-                                                       location,
-                                                       client,
-                                                       gmaps_client,
-                                                       openweather_key,
-                                                       available_hotels=available_hotels,
-                                                       budget_breakdown=budget_breakdown,
-                                                       trip_duration=trip_duration)
+            # Reuse an itinerary already generated for the same trip, even from an earlier session,
+            # as long as it came from the same model and prompts
+            trip_key = trip_cache_key(LLM_MODEL, ITINERARY_PROMPT_VERSION, destination.strip().lower(),
+                                      no_of_adults, no_of_children, start_date, end_date, budget, tuple(sorted(interests)),
+                                      accommodation_type, accommodation_rating, show_hotels)
+            cached_trip = load_cached_trip(trip_key)
+            if cached_trip is not None:
+                user_input, itinerary = cached_trip
+            else:
+                llm, _ = load_llm_clients()
+                completion_info = {}
+                itinerary_stream, user_input = generate_itinerary(destination,
+                                                                  no_of_adults, 
+                                                                  no_of_children,
+                                                                  start_date,
+                                                                  end_date,
+                                                                  budget,
+                                                                  interests,
+                                                                  location,
+                                                                  llm, # Cached LangChain LLM
+                                                                  gmaps_client,
+                                                                  openweather_key,
+                                                                  available_hotels=available_hotels,
+                                                                  budget_breakdown=budget_breakdown,
+                                                                  trip_duration=trip_duration,
+                                                                  completion_info=completion_info)
+
+                # Show the itinerary as it streams in; the placeholder is cleared once it is complete
+                # because render_results_and_refinement() displays the final text below
+                stream_placeholder = st.empty()
+                with stream_placeholder.container():
+                    itinerary = st.write_stream(itinerary_stream)
+                stream_placeholder.empty()
+                # An itinerary cut off by the token limit is shown but not kept for later requests
+                if completion_info.get("finish_reason") != "length":
+                    store_cached_trip(trip_key, (user_input, itinerary))
 
             # --- Update Session State ---
+            from langchain_community.chat_message_histories import ChatMessageHistory
             st.session_state.history = ChatMessageHistory() # Reset history for a new plan
             st.session_state.history.add_user_message(user_input)
             st.session_state.history.add_ai_message(itinerary)
             st.session_state.itinerary_generated = True
             st.session_state.current_itinerary = itinerary
+            st.session_state.trip_key = trip_key
             st.session_state.available_hotels = available_hotels
             st.session_state.budget_breakdown = budget_breakdown
             st.session_state.trip_duration = trip_duration
@@ -385,13 +443,13 @@ def render_results_and_refinement():
     This function checks if an itinerary has been generated by verifying the 
     `itinerary_generated` flag in the session state. If the flag is set, it displays 
     the current itinerary and provides a text input field for users to request changes 
-    to the plan. Users can submit their refinement requests using a button, which 
-    triggers the refinement process.
+    to the plan. Users can submit their refinement requests using a form submit button,
+    which triggers the refinement process.
 
     Key Features:
     - Displays the AI-generated itinerary stored in the session state.
     - Provides a text input field for users to specify changes to the itinerary.
-    - Includes a button to trigger the refinement process.
+    - Groups the input and button in a form so edits only rerun the app on submit.
     - Validates user input and displays a warning if no input is provided.
 
     Session State Keys:
@@ -408,69 +466,42 @@ def render_results_and_refinement():
     """
     if not st.session_state.get('itinerary_generated', False):
         return
-    """
-    Displays the generated itinerary and provides a section for users to refine the plan.
-
-    This function checks if an itinerary has been generated by verifying the 
-    `itinerary_generated` flag in the session state. If the flag is set, it displays 
-    the current itinerary and provides a text input field for users to request changes 
-    to the plan. Users can submit their refinement requests using a button, which 
-    triggers the refinement process.
-
-    Key Features:
-    - Displays the AI-generated itinerary stored in the session state.
-    - Provides a text input field for users to specify changes to the itinerary.
-    - Includes a button to trigger the refinement process.
-    - Validates user input and displays a warning if no input is provided.
-
-    Session State Keys:
-    - `itinerary_generated` (bool): Indicates whether an itinerary has been generated.
-    - `current_itinerary` (str): Stores the current itinerary to be displayed.
-    - `refine_input` (str): Stores the user's refinement request.
-
-    Dependencies:
-    - `generate_refined_plan(user_input_refine)`: A function that processes the user's 
-        refinement request and updates the itinerary.
-
-    Returns:
-        None
-    """
-   if not st.session_state.get('itinerary_generated', False):
-       return
-   st.markdown("## Your AI-generated itinerary")
-   # Display the current itinerary safely using .get
-   st.write(st.session_state.get('current_itinerary', "No itinerary generated yet."))
-   if st.session_state.get("available_hotels"):
-       st.markdown("## Available Hotels Within Budget")
-       budget_breakdown = st.session_state.get("budget_breakdown") or {}
-       trip_duration = st.session_state.get("trip_duration") or 1
-       if budget_breakdown:
-           st.caption(
-               "Estimated budget split — "
-               f"Lodging: £{budget_breakdown.get('lodging_budget', 0):.0f}, "
-               f"Food: £{budget_breakdown.get('food', 0):.0f}, "
-               f"Local travel: £{budget_breakdown.get('local_travel', 0):.0f}, "
-               f"Tickets: £{budget_breakdown.get('tickets', 0):.0f}."
-           )
-       for hotel in st.session_state.available_hotels[:10]:
-           nightly = hotel.get("estimated_nightly_rate")
-           total_stay = hotel.get("estimated_total_stay_cost")
-           st.write(
-               f"**{hotel.get('name','Hotel')}** — Rating: {hotel.get('rating','N/A')} "
-               f"({hotel.get('user_ratings_total', 0)} reviews), "
-               f"Est. £{nightly}/night, Est. total £{total_stay:.0f} for {trip_duration} nights. "
-               f"Location: {hotel.get('vicinity','N/A')}"
-           )
-   elif st.session_state.get("show_hotels"):
-       st.markdown("## Available Hotels Within Budget")
-       st.info("No hotels matched the budget and rating filters for your dates. Try lowering the rating or increasing the budget.")
+    st.markdown("## Your AI-generated itinerary")
+    # Display the current itinerary safely using .get
+    st.write(st.session_state.get('current_itinerary', "No itinerary generated yet."))
+    if st.session_state.get("available_hotels"):
+        st.markdown("## Available Hotels Within Budget")
+        budget_breakdown = st.session_state.get("budget_breakdown") or {}
+        trip_duration = st.session_state.get("trip_duration") or 1
+        if budget_breakdown:
+            st.caption(
+                "Estimated budget split — "
+                f"Lodging: £{budget_breakdown.get('lodging_budget', 0):.0f}, "
+                f"Food: £{budget_breakdown.get('food', 0):.0f}, "
+                f"Local travel: £{budget_breakdown.get('local_travel', 0):.0f}, "
+                f"Tickets: £{budget_breakdown.get('tickets', 0):.0f}."
+            )
+        for hotel in st.session_state.available_hotels[:10]:
+            nightly = hotel.get("estimated_nightly_rate")
+            total_stay = hotel.get("estimated_total_stay_cost")
+            st.write(
+                f"**{hotel.get('name','Hotel')}** — Rating: {hotel.get('rating','N/A')} "
+                f"({hotel.get('user_ratings_total', 0)} reviews), "
+                f"Est. £{nightly}/night, Est. total £{total_stay:.0f} for {trip_duration} nights. "
+                f"Location: {hotel.get('vicinity','N/A')}"
+            )
+    elif st.session_state.get("show_hotels"):
+        st.markdown("## Available Hotels Within Budget")
+        st.info("No hotels matched the budget and rating filters for your dates. Try lowering the rating or increasing the budget.")
     st.markdown("---")  # Separator
     st.markdown("## Refine Your Plan")
 
-    # Text input for user refinement requests
-    user_input_refine = st.text_input("Do you want some changes (e.g. 'Add more food experiences on Day 2')? If No, enter 'Exit' to quit:", key="refine_input")
-    
-    if st.button("Refine Plan"):
+    # Wrap the refine controls in a form so typing does not rerun the script until submit
+    with st.form("refine_form"):
+        user_input_refine = st.text_input("Do you want some changes (e.g. 'Add more food experiences on Day 2')? If No, enter 'Exit' to quit:", key="refine_input")
+        submitted = st.form_submit_button("Refine Plan")
+
+    if submitted:
         if not user_input_refine:  # Check if there is no input before refining
             st.warning("Please enter your requested changes before refining.")
             return  # Exit early if no valid input is provided
@@ -502,7 +533,6 @@ def main():
     and provides options for refining the itinerary.
 
     Key Features:
-    - Configures the Streamlit page with a title, icon, and layout.
     - Displays an input form for users to provide trip details such as destination, dates, 
         budget, and interests.
     - Validates user inputs using external services like Google Maps and handles errors 
@@ -522,28 +552,24 @@ def main():
     Returns:
     None
     """
-    st.set_page_config(page_title="AI Trip Planner", page_icon=":airplane:", layout="wide")
-    st.title("AI Trip Planner")
-
-    # --- Get API Clients (assuming these are initialized globally or passed) ---
-    # Ensure gmaps, client, OPENAI_API_KEY, openweather_api_key are accessible here
-    # For simplicity, assuming they are available in the scope as per the original code
-    # If they are initialized outside main, ensure they are accessible.
-    # Example: gmaps_client = gmaps, openai_client = client, etc.
+    # The page config and title are set at the top of the module, so they paint first
 
     # --- Input Form ---
-    # Uses globally initialized gmaps, client, openweather_api_key   
-    submitted, destination, no_of_adults, no_of_children, start_date, end_date, budget, interests, accommodation_type, accommodation_rating, show_hotels = render_input_form()
+    # Uses globally initialized gmaps, openweather_api_key   
+    submitted, destination, no_of_adults, no_of_children, start_date, end_date, budget, interests, accommodation_type, accommodation_rating, show_hotels = render_input_form(gmaps, openweather_api_key)
 
     # --- Handle Form Submission ---
     if submitted:
+        # Let any background prefetch for this destination finish so validation hits the cache
+        wait_for_prefetch(destination)
+
         # --- Input Validation ---
         # Pass the initialized gmaps client to the validation function
         errors, geocode_result = validate_user_inputs(destination, start_date, end_date, budget, interests, gmaps)
 
         if errors:
-            for error in errors:
-                st.error(error)
+            # Show all validation errors together, as one markdown bullet list
+            st.error("- " + "\n- ".join(errors))
             # Reset generation flag if validation fails after a successful generation
             st.session_state.itinerary_generated = False
             st.session_state.current_itinerary = ""
@@ -558,7 +584,6 @@ def main():
                                       budget,
                                       interests,
                                       geocode_result,
-                                      client, # Global OpenAI client
                                       gmaps,  # Global Google Maps client
                                       openweather_api_key, # Global OpenWeather API key
                                       accommodation_type,
@@ -569,6 +594,10 @@ def main():
     # This part runs on every interaction if an itinerary exists
     render_results_and_refinement()
 
+    # Build the LLM clients after the page has rendered, so this is done while the user fills
+    # in the form rather than before first paint (a no-op once they are cached)
+    load_llm_clients()
+
 # --- Run the App ---
 if __name__ == "__main__":
     #Call main function to run the Streamlit app